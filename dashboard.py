@@ -1,43 +1,99 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import json
+import plotly.graph_objects as go
+import collections
+import threading
+import sys
 from datetime import datetime, timedelta
 import time
 import os
 
-def load_activity_log():
+# The log readers live next to the monitor that writes the log
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+from activity_log import read_new_events
+
+LOG_FILE = 'activity_log.jsonl'
+TIMELINE_BIN = '1min'
+
+class ActivitySummary:
+    """
+    What the page shows of the log: the event count, per-bin timeline
+    counts and the most recent events. Each refresh folds in only the
+    events appended since the previous one, tracked by byte offset.
+    """
+    def __init__(self, recent: int):
+        self.recent = recent
+        self.lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        """Forget everything read so far, e.g. after the log was replaced"""
+        self.offset = 0
+        self.total = 0
+        self.counts = pd.Series(dtype='int64')
+        self.last_events = collections.deque(maxlen=self.recent)
+    
+    def refresh(self):
+        """
+        Read the events appended to the log since the last refresh.
+        
+        Returns:
+            Tuple of (event count, per-bin event counts, DataFrame of the
+            most recent events)
+        """
+        with self.lock:
+            if os.path.getsize(LOG_FILE) < self.offset:
+                self.reset()  # Truncated or rewritten
+            columns, self.offset = read_new_events(LOG_FILE, self.offset)
+            if columns:
+                tail = pd.DataFrame(columns)
+                tail['timestamp'] = pd.to_datetime(tail['timestamp'], unit='ns')
+                tail.index = pd.RangeIndex(self.total, self.total + len(tail))
+                self.total += len(tail)
+                # Merge the new bins into the old ones; resampling the sum
+                # fills the bins of quiet gaps with zeros again
+                new_counts = tail.set_index('timestamp').resample(TIMELINE_BIN).size()
+                self.counts = (self.counts.add(new_counts, fill_value=0)
+                               .resample(TIMELINE_BIN).sum().astype('int64'))
+                last = tail.tail(self.recent)
+                self.last_events.extend(zip(last.index, last.to_dict('records')))
+            
+            index, rows = zip(*self.last_events) if self.last_events else ((), ())
+            return self.total, self.counts, pd.DataFrame(list(rows), index=list(index))
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def activity_summary(recent: int) -> ActivitySummary:
+    """One running summary for the server process, shared across reruns and sessions"""
+    return ActivitySummary(recent)
+
+def summarize_activity_log(recent=10):
+    """Summary of the log as of now; see ActivitySummary.refresh"""
     try:
-        with open('activity_log.json', 'r') as f:
-            data = json.load(f)
-            if 'events' in data:
-                return pd.DataFrame(data['events'])
+        return activity_summary(recent).refresh()
+    except FileNotFoundError:
+        pass
     except Exception as e:
         st.error('Error loading activity log')
-    return pd.DataFrame()
+    return 0, pd.Series(dtype='int64'), pd.DataFrame()
 
 def main():
     st.title("Ransomware Detection Monitor")
     
     # Load and process data
-    df = load_activity_log()
+    total_events, counts, recent_df = summarize_activity_log()
     
-    if not df.empty:
-        # Convert timestamps
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
-        
+    if total_events:
         # Basic metrics
-        total_events = len(df)
         st.metric("Total Events", total_events)
         
         # Timeline
         st.subheader("Activity Timeline")
-        fig = px.histogram(df, x='timestamp', title='File Events Over Time')
+        fig = go.Figure(go.Bar(x=counts.index, y=counts.values))
+        fig.update_layout(title='File Events Over Time')
         st.plotly_chart(fig)
         
         # Recent events
         st.subheader("Recent Events")
-        recent_df = df.tail(10)
         st.dataframe(recent_df)
     else:
         st.info("No data available")
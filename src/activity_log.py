@@ -0,0 +1,66 @@
+import os
+import mmap
+from typing import Dict, List, Tuple
+import orjson
+
+# Readers of the JSON-lines activity log written by
+# file_monitor.FileEventHandler. Kept free of the watchdog and Streamlit
+# imports so the analyzer and the dashboards can load events cheaply.
+
+def _decode_columns(lines) -> Dict[str, List]:
+    """Decode JSON event lines straight into one list per event field"""
+    columns = {}
+    count = 0
+    for line in filter(bytes.strip, lines):
+        try:
+            event = orjson.loads(line)
+        except orjson.JSONDecodeError:
+            continue  # Partial event from a crash or a foreign write
+        for name, value in event.items():
+            if name not in columns:
+                columns[name] = [None] * count
+            columns[name].append(value)
+        count += 1
+        if len(event) < len(columns):
+            # Pad the fields this event lacks so the columns stay aligned
+            for values in columns.values():
+                if len(values) < count:
+                    values.append(None)
+    return columns
+
+def read_events(log_file: str) -> Dict[str, List]:
+    """
+    Read the activity log into one list per event field.
+    
+    The file is memory-mapped and each line is decoded straight into the
+    column lists, so no per-event dicts are kept alive and no buffered copy
+    of the file is made.
+    
+    Returns:
+        Dictionary mapping field name -> list of values in log order, with
+        None where an event lacks a field
+    """
+    if os.path.getsize(log_file) == 0:
+        return {}  # An empty file cannot be mapped
+    
+    with open(log_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return _decode_columns(iter(mm.readline, b''))
+
+def read_new_events(log_file: str, offset: int = 0) -> Tuple[Dict[str, List], int]:
+    """
+    Read the events appended to the activity log after byte ``offset``.
+    Only complete lines are read; a line the writer is still appending is
+    left for the next call.
+    
+    Returns:
+        Tuple of (columns as returned by read_events, offset just past the
+        last complete line read)
+    """
+    if os.path.getsize(log_file) <= offset:
+        return {}, offset
+    
+    with open(log_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        end = mm.rfind(b'\n', offset) + 1
+        if end <= offset:
+            return {}, offset
+        return _decode_columns(mm[offset:end].splitlines()), end
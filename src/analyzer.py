@@ -2,10 +2,94 @@ import pandas as pd
 import numpy as np
 from pathlib import Path
 import concurrent.futures
+import multiprocessing
+import mmap
+import os
+import re
 import logging
+import threading
 from typing import List, Dict, Tuple
-import json
-from datetime import datetime
+import orjson
+from activity_log import read_new_events
+
+# Positional columns of a network log line; column 6 is unused
+LOG_COLUMNS = [0, 1, 2, 3, 4, 5, 7, 8]
+LOG_COLUMN_NAMES = ['timestamp', 'src_ip', 'dst_ip', 'src_port', 'dst_port',
+                    'protocol', 'bytes_sent', 'bytes_received']
+# Low-cardinality string columns are parsed straight into categoricals so
+# value_counts/nunique work on integer codes instead of hashing strings.
+# Numeric columns are read as text and coerced afterwards, so a malformed
+# line (a header, a '-' port, a missing field) drops only that line
+LOG_DTYPES = {
+    'timestamp': str,
+    'src_ip': 'category',
+    'dst_ip': 'category',
+    'src_port': str,
+    'dst_port': str,
+    'protocol': 'category',
+    'bytes_sent': str,
+    'bytes_received': str
+}
+PORT_COLUMNS = ['src_port', 'dst_port']
+BYTE_COLUMNS = ['bytes_sent', 'bytes_received']
+MAX_PORT = 65535
+
+# Substrings in a file path that mark it as likely encrypted by ransomware
+SUSPICIOUS_EXTENSIONS = ['.encrypt', '.locked', '.crypted', '.cry', '.crypto']
+_SUSP_EXT_RE = re.compile('|'.join(re.escape(ext) for ext in SUSPICIOUS_EXTENSIONS),
+                          re.IGNORECASE)
+
+# Threat indicator flags and the message reported for each
+THREAT_INDICATORS = [
+    ('rapid', "Rapid file operations detected"),
+    ('suspicious', "Suspicious file extension detected"),
+    ('high_volume', "High volume of file operations")
+]
+
+# Activity log fields held as categoricals by RansomwareAnalyzer
+CATEGORY_COLUMNS = ['event_type', 'path']
+
+# Most recent activity log events RansomwareAnalyzer keeps loaded; older
+# events are dropped so memory stays bounded however long the log grows
+MAX_LOADED_EVENTS = 200_000
+
+# Log files handed to a worker per task, amortizing pickling and IPC
+FILES_PER_TASK = 32
+
+def _warm_worker():
+    """
+    Pool initializer. Workers started with spawn (Windows) import the heavy
+    modules once at startup instead of while unpickling their first task;
+    under fork they are already loaded and this is a no-op.
+    """
+    import numpy
+    import pandas
+
+def _rapid_paths(path_codes: np.ndarray, timestamps: np.ndarray, n_paths: int) -> np.ndarray:
+    """
+    Flag paths with two consecutive events less than a second apart.
+    
+    Args:
+        path_codes: Integer path code per event, -1 for a missing path
+        timestamps: datetime64 timestamp per event
+        n_paths: Number of distinct path codes
+        
+    Returns:
+        Boolean array indexed by path code
+    """
+    valid = path_codes >= 0
+    path_codes, timestamps = path_codes[valid], timestamps[valid]
+    
+    # A stable sort groups events by path while keeping their log order
+    order = np.argsort(path_codes, kind='stable')
+    path_codes, timestamps = path_codes[order], timestamps[order]
+    
+    same_path = path_codes[1:] == path_codes[:-1]
+    close = (timestamps[1:] - timestamps[:-1]) < np.timedelta64(1, 's')
+    
+    rapid = np.zeros(n_paths, dtype=bool)
+    rapid[path_codes[1:][same_path & close]] = True
+    return rapid
 
 class RansomwareLogProcessor:
     def __init__(self, nat_dir: str, original_dir: str):
@@ -28,60 +112,84 @@ class RansomwareLogProcessor:
         )
         self.logger = logging.getLogger(__name__)
     
-    def parse_log_line(self, line: str) -> Dict:
+    def read_log_file(self, file_path: Path) -> pd.DataFrame:
         """
-        Parse a single log line into structured data.
-        """
-        try:
-            # Split on whitespace since fields are space-separated
-            fields = line.strip().split()
-            
-            # Convert timestamp (which is in seconds) to datetime
-            timestamp = float(fields[0])  # This is in seconds
-            # Convert to datetime by adding it to a base date
-            dt = datetime.fromtimestamp(timestamp)
+        Read a whitespace-separated log file into a DataFrame.
+        
+        Args:
+            file_path: Path to log file
             
-            return {
-                'timestamp': dt,
-                'src_ip': fields[1],
-                'dst_ip': fields[2],
-                'src_port': int(fields[3]),
-                'dst_port': int(fields[4]),
-                'protocol': fields[5],
-                'bytes_sent': int(fields[7]) if fields[7] != '-' else 0,
-                'bytes_received': int(fields[8]) if fields[8] != '-' else 0
-            }
-        except Exception as e:
-            self.logger.error(f"Error parsing line: {line}")
-            self.logger.error(f"Error details: {str(e)}")
-            return None
+        Returns:
+            DataFrame with one row per log line and a datetime timestamp column
+        """
+        if file_path.stat().st_size == 0:
+            return pd.DataFrame(columns=LOG_COLUMN_NAMES)
+        
+        # Parse straight from the page cache instead of a buffered copy
+        with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            df = pd.read_csv(
+                mm,
+                sep=r'\s+',
+                header=None,
+                usecols=LOG_COLUMNS,
+                names=LOG_COLUMN_NAMES,
+                dtype=LOG_DTYPES,
+                # Only a '-' byte count is missing; it counts as 0
+                keep_default_na=False,
+                na_values={column: ['-'] for column in BYTE_COLUMNS},
+                on_bad_lines='skip',
+                engine='c'
+            )
+        df[BYTE_COLUMNS] = df[BYTE_COLUMNS].fillna('0')
+        numbers = df[['timestamp'] + PORT_COLUMNS + BYTE_COLUMNS].apply(pd.to_numeric,
+                                                                         errors='coerce')
+        counts = numbers[PORT_COLUMNS + BYTE_COLUMNS]
+        ports = numbers[PORT_COLUMNS]
+        valid = (numbers.notna().all(axis=1) & (counts % 1 == 0).all(axis=1)
+                 & ((ports >= 0) & (ports <= MAX_PORT)).all(axis=1))
+        if not valid.all():
+            self.logger.warning(f"Skipped {(~valid).sum()} malformed lines in {file_path}")
+            df, numbers = df[valid].reset_index(drop=True), numbers[valid].reset_index(drop=True)
+            for column in df.select_dtypes('category'):
+                df[column] = df[column].cat.remove_unused_categories()
+        df[PORT_COLUMNS] = numbers[PORT_COLUMNS].astype('uint16')
+        df[BYTE_COLUMNS] = numbers[BYTE_COLUMNS].astype('int64')
+        df['timestamp'] = pd.to_datetime(numbers['timestamp'], unit='s')
+        return df
 
-    def extract_features(self, parsed_data: List[Dict]) -> Dict:
+    def extract_features(self, df: pd.DataFrame) -> Dict:
         """
         Extract relevant features from parsed log data.
         
         Args:
-            parsed_data: List of parsed log line dictionaries
+            df: DataFrame of parsed log lines
             
         Returns:
             Dictionary of computed features
         """
-        if not parsed_data:
+        if df.empty:
             return {}
-            
-        df = pd.DataFrame(parsed_data)
+        
+        # Reductions shared by several features are computed once
+        tmin, tmax = df['timestamp'].agg(['min', 'max'])
+        duration = (tmax - tmin).total_seconds()
+        # Plain arrays skip index alignment
+        bytes_sent = df['bytes_sent'].to_numpy()
+        bytes_received = df['bytes_received'].to_numpy()
+        sent_total = bytes_sent.sum()
+        packet_sizes = bytes_sent + bytes_received
         
         features = {
             # Time-based features
-            'duration_seconds': (df['timestamp'].max() - df['timestamp'].min()).total_seconds(),
+            'duration_seconds': duration,
             'avg_time_between_packets': df['timestamp'].diff().mean().total_seconds(),
             
             # Network features
             'unique_dst_ips': df['dst_ip'].nunique(),
             'unique_dst_ports': df['dst_port'].nunique(),
-            'total_bytes_sent': df['bytes_sent'].sum(),
-            'total_bytes_received': df['bytes_received'].sum(),
-            'bytes_sent_per_second': df['bytes_sent'].sum() / (df['timestamp'].max() - df['timestamp'].min()).total_seconds(),
+            'total_bytes_sent': sent_total,
+            'total_bytes_received': bytes_received.sum(),
+            'bytes_sent_per_second': sent_total / duration if duration > 0 else 0.0,
             
             # Protocol distribution
             'protocol_distribution': df['protocol'].value_counts().to_dict(),
@@ -90,8 +198,8 @@ class RansomwareLogProcessor:
             'common_dst_ports': df['dst_port'].value_counts().head(10).to_dict(),
             
             # Traffic patterns
-            'avg_packet_size': (df['bytes_sent'] + df['bytes_received']).mean(),
-            'packet_size_std': (df['bytes_sent'] + df['bytes_received']).std()
+            'avg_packet_size': packet_sizes.mean(),
+            'packet_size_std': packet_sizes.std(ddof=1) if len(packet_sizes) > 1 else np.nan
         }
         
         return features
@@ -112,20 +220,39 @@ class RansomwareLogProcessor:
         ransomware_family = file_path.parent.name
         
         try:
-            parsed_data = []
-            with open(file_path, 'r') as f:
-                for line in f:
-                    parsed_line = self.parse_log_line(line)
-                    if parsed_line:
-                        parsed_data.append(parsed_line)
-            
-            features = self.extract_features(parsed_data)
+            df = self.read_log_file(file_path)
+            features = self.extract_features(df)
             return ransomware_family, features
             
         except Exception as e:
             self.logger.error(f"Error processing file {file_path}: {str(e)}")
             return ransomware_family, {}
 
+    def process_file_batch(self, file_paths: List[Path]) -> List[Tuple[str, Dict]]:
+        """
+        Process several log files inside a single worker task.
+        
+        Args:
+            file_paths: Paths to log files
+            
+        Returns:
+            List of (ransomware_family, features_dict) tuples
+        """
+        return [self.process_single_file(file_path) for file_path in file_paths]
+
+    def create_executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        """Create the process pool used to parse log files"""
+        # Forked workers inherit the already-imported pandas/numpy modules
+        mp_context = None
+        if 'fork' in multiprocessing.get_all_start_methods():
+            mp_context = multiprocessing.get_context('fork')
+        
+        # Leave one core for the coordinating process
+        max_workers = max(1, (os.cpu_count() or 1) - 1)
+        return concurrent.futures.ProcessPoolExecutor(max_workers=max_workers,
+                                                      mp_context=mp_context,
+                                                      initializer=_warm_worker)
+
     def process_directory(self, directory: Path) -> Dict:
         """
         Process all log files in a directory using parallel execution.
@@ -133,25 +260,40 @@ class RansomwareLogProcessor:
         Args:
             directory: Path to directory containing log files
             
+        Returns:
+            Dictionary mapping ransomware families to their features
+        """
+        with self.create_executor() as executor:
+            return self._run(executor, directory)
+
+    def _run(self, executor: concurrent.futures.Executor, directory: Path) -> Dict:
+        """
+        Process all log files in a directory on an existing executor.
+        
+        Args:
+            executor: Pool the file batches are submitted to
+            directory: Path to directory containing log files
+            
         Returns:
             Dictionary mapping ransomware families to their features
         """
         results = {}
         log_files = list(directory.glob('**/*.log'))
+        batches = [log_files[i:i + FILES_PER_TASK]
+                   for i in range(0, len(log_files), FILES_PER_TASK)]
         
-        with concurrent.futures.ProcessPoolExecutor() as executor:
-            future_to_file = {executor.submit(self.process_single_file, file_path): file_path 
-                            for file_path in log_files}
-            
-            for future in concurrent.futures.as_completed(future_to_file):
-                file_path = future_to_file[future]
-                try:
-                    family, features = future.result()
+        future_to_batch = {executor.submit(self.process_file_batch, batch): batch
+                           for batch in batches}
+        
+        for future in concurrent.futures.as_completed(future_to_batch):
+            batch = future_to_batch[future]
+            try:
+                for family, features in future.result():
                     if family not in results:
                         results[family] = []
                     results[family].append(features)
-                except Exception as e:
-                    self.logger.error(f"Error processing {file_path}: {str(e)}")
+            except Exception as e:
+                self.logger.error(f"Error processing batch starting at {batch[0]}: {str(e)}")
         
         return results
 
@@ -164,15 +306,20 @@ class RansomwareLogProcessor:
         """
         self.logger.info("Starting processing of all log files...")
         
-        results = {
-            'nat_scenario': self.process_directory(self.nat_dir),
-            'originalScenario': self.process_directory(self.original_dir)
-        }
+        # One pool serves both scenarios instead of forking workers twice
+        with self.create_executor() as executor:
+            results = {
+                'nat_scenario': self._run(executor, self.nat_dir),
+                'originalScenario': self._run(executor, self.original_dir)
+            }
         
-        # Save results to file
+        # Save results to file; compact, since indentation roughly doubles
+        # the size of the per-file feature dicts
         output_file = 'processed_ransomware_data.json'
-        with open(output_file, 'w') as f:
-            json.dump(results, f, indent=2, default=str)
+        Path(output_file).write_bytes(orjson.dumps(
+            results,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        ))
         
         self.logger.info(f"Processing complete. Results saved to {output_file}")
         return results
@@ -182,6 +329,11 @@ class RansomwareAnalyzer:
     def __init__(self, log_file: str):
         """Initialize the RansomwareAnalyzer."""
         self.log_file = log_file
+        # Events loaded so far and the log offset they end at; the log is
+        # append-only, so each load only parses the lines added since
+        self._frame = pd.DataFrame()
+        self._offset = 0
+        self._load_lock = threading.Lock()
         self.setup_logging()
         
     def setup_logging(self):
@@ -193,17 +345,24 @@ class RansomwareAnalyzer:
         self.logger = logging.getLogger(__name__)
     
     def load_activity_log(self) -> pd.DataFrame:
-        """Load and parse the activity log file into a DataFrame."""
+        """
+        Load and parse the activity log file into a DataFrame.
+        
+        Only the events appended since the previous call are parsed and
+        added to the events already loaded, of which the last
+        MAX_LOADED_EVENTS are kept. A log that shrank, e.g. after
+        compact_log, is reloaded from the start.
+        """
         try:
-            with open(self.log_file, 'r') as f:
-                data = json.load(f)
-            
-            if not data:
-                return pd.DataFrame()
+            with self._load_lock:
+                if os.path.getsize(self.log_file) < self._offset:
+                    self._frame, self._offset = pd.DataFrame(), 0
                 
-            df = pd.DataFrame(data)
-            df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
-            return df
+                columns, offset = read_new_events(self.log_file, self._offset)
+                if columns:
+                    self._frame = self._append_events(pd.DataFrame(columns))
+                self._offset = offset
+                return self._frame.copy(deep=False)
             
         except FileNotFoundError:
             self.logger.warning(f"Log file not found: {self.log_file}")
@@ -212,47 +371,84 @@ class RansomwareAnalyzer:
             self.logger.error(f"Error loading activity log: {str(e)}")
             return pd.DataFrame()
     
+    def _append_events(self, tail: pd.DataFrame) -> pd.DataFrame:
+        """
+        Convert newly read events and append them to the loaded events.
+        
+        Args:
+            tail: Events read from the log since the last load
+            
+        Returns:
+            DataFrame of the last MAX_LOADED_EVENTS loaded events in log order
+        """
+        tail['timestamp'] = pd.to_datetime(tail['timestamp'], unit='ns')
+        df = self._frame
+        for name in CATEGORY_COLUMNS:
+            # Dictionary-encode the repeated strings once, so value_counts,
+            # groupby and the path checks work on integer codes and run the
+            # string operations once per distinct value
+            values = tail[name].astype('category')
+            if not df.empty:
+                # Recode both sides onto the sorted union of their values,
+                # as one astype over the whole log would, so concat keeps
+                # the category dtype
+                categories = df[name].cat.categories.union(values.cat.categories)
+                df[name] = df[name].cat.set_categories(categories)
+                values = values.cat.set_categories(categories)
+            tail[name] = values
+        
+        if not df.empty:
+            tail = pd.concat([df, tail], ignore_index=True)
+        if len(tail) > MAX_LOADED_EVENTS:
+            tail = tail.iloc[-MAX_LOADED_EVENTS:].reset_index(drop=True)
+            for name in CATEGORY_COLUMNS:
+                # Forget the paths only the dropped events used
+                tail[name] = tail[name].cat.remove_unused_categories()
+        return tail
+    
     def analyze_threats(self, df: pd.DataFrame) -> List[Dict]:
         """Analyze potential threats from the activity log."""
+        if df.empty:
+            return []
+        
+        # Per-path aggregates computed in one groupby pass
+        grouped = df.groupby('path', observed=True)['timestamp']
+        summary = grouped.agg(first_seen='min', last_seen='max', event_count='size')
+        
+        # Check for rapid file operations; sorted codes line up with summary.index
+        path_codes, _ = pd.factorize(df['path'], sort=True)
+        summary['rapid'] = _rapid_paths(path_codes, df['timestamp'].to_numpy(), len(summary))
+        
+        # Check for suspicious extensions, once per distinct path
+        summary['suspicious'] = summary.index.to_series().astype(str).str.contains(_SUSP_EXT_RE)
+        
+        # Check for multiple file modifications
+        summary['high_volume'] = summary['event_count'] > 10
+        
+        summary['threat_score'] = (
+            np.where(summary['rapid'], 2, 0)
+            + np.where(summary['suspicious'], 3, 0)
+            + np.where(summary['high_volume'], 1, 0)
+        )
+        
+        # Keep threats above threshold, highest score first
+        flagged = summary[summary['threat_score'] >= 2].sort_values(
+            'threat_score', ascending=False, kind='stable'
+        )
+        
         threats = []
+        for path, row in zip(flagged.index, flagged.to_dict('records')):
+            threats.append({
+                'path': path,
+                'threat_score': int(row['threat_score']),
+                'indicators': [message for column, message in THREAT_INDICATORS
+                               if row[column]],
+                'first_seen': row['first_seen'],
+                'last_seen': row['last_seen'],
+                'event_count': int(row['event_count'])
+            })
         
-        if df.empty:
-            return threats
-            
-        # Group events by path to analyze per-file behavior
-        for path, group in df.groupby('path'):
-            threat_score = 0
-            threat_indicators = []
-            
-            # Check for rapid file operations
-            time_diffs = group['timestamp'].diff()
-            if (time_diffs < pd.Timedelta(seconds=1)).any():
-                threat_score += 2
-                threat_indicators.append("Rapid file operations detected")
-            
-            # Check for suspicious extensions
-            suspicious_extensions = ['.encrypt', '.locked', '.crypted', '.cry', '.crypto']
-            if any(ext in str(path).lower() for ext in suspicious_extensions):
-                threat_score += 3
-                threat_indicators.append("Suspicious file extension detected")
-            
-            # Check for multiple file modifications
-            if len(group) > 10:
-                threat_score += 1
-                threat_indicators.append("High volume of file operations")
-            
-            # Add to threats if score exceeds threshold
-            if threat_score >= 2:
-                threats.append({
-                    'path': path,
-                    'threat_score': threat_score,
-                    'indicators': threat_indicators,
-                    'first_seen': group['timestamp'].min(),
-                    'last_seen': group['timestamp'].max(),
-                    'event_count': len(group)
-                })
-        
-        return sorted(threats, key=lambda x: x['threat_score'], reverse=True)
+        return threats
     
     def get_event_distribution(self, df: pd.DataFrame) -> Dict:
         """Get distribution of event types."""
@@ -266,10 +462,7 @@ class RansomwareAnalyzer:
         if df.empty:
             return {}
             
-        def get_extension(path):
-            return path.split('.')[-1] if '.' in path else 'no_extension'
-            
-        extensions = df['path'].apply(get_extension)
+        extensions = df['path'].str.extract(r'\.([^.]*)$', expand=False).fillna('no_extension')
         return extensions.value_counts().head(10).to_dict()
     
     def get_activity_timeline(self, df: pd.DataFrame, 
@@ -278,4 +471,4 @@ class RansomwareAnalyzer:
         if df.empty:
             return pd.Series()
             
-        return df.set_index('timestamp').resample(interval).size()
\ No newline at end of file
+        return df.set_index('timestamp').resample(interval).size()
@@ -0,0 +1,19 @@
+from typing import List, Dict
+import streamlit as st
+from analyzer import RansomwareAnalyzer
+
+# Streamlit entry points for the analyzer. Results are cached on the log
+# file's path and mtime, so reruns skip re-analysis while the file is
+# unchanged and the DataFrame itself never has to be hashed. Only the
+# newest version is kept: a live log changes on nearly every write.
+
+@st.cache_resource(show_spinner=False)
+def shared_analyzer(log_file: str) -> RansomwareAnalyzer:
+    """One analyzer per log for the server process, so loads stay incremental"""
+    return RansomwareAnalyzer(log_file)
+
+@st.cache_data(show_spinner=False, max_entries=1)
+def analyze_threats_cached(log_file: str, mtime: float) -> List[Dict]:
+    """Cached RansomwareAnalyzer.analyze_threats"""
+    analyzer = shared_analyzer(log_file)
+    return analyzer.analyze_threats(analyzer.load_activity_log())
@@ -2,22 +2,86 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import json
+import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import time
 import os
 from trainer import RansomwareTrainer
+from activity_log import read_events
+from analyzer_cache import analyze_threats_cached
 
-def load_activity_log():
+LOG_FILE = 'activity_log.jsonl'
+TIMELINE_BIN = '1min'
+# Slider positions whose recent-events views stay cached for the current log
+SLIDER_CACHE_ENTRIES = 4
+# Highest-scoring threats listed on the page
+MAX_THREATS_SHOWN = 20
+
+def get_log_mtime():
+    """Modification time of the activity log, used as the cache key"""
+    try:
+        return os.path.getmtime(LOG_FILE)
+    except OSError:
+        return None
+
+@st.cache_data(show_spinner=False, max_entries=1)
+def load_activity_log(mtime):
+    """
+    Load the activity log; re-read only when ``mtime`` changes. Only the
+    newest version is kept, so a live log does not pile up stale frames.
+    """
     try:
-        with open('activity_log.json', 'r') as f:
-            data = json.load(f)
-            if 'events' in data:
-                return pd.DataFrame(data['events'])
+        df = pd.DataFrame(read_events(LOG_FILE))
+        if not df.empty:
+            df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ns')
+        return df
     except Exception as e:
         st.error('Error loading activity log')
     return pd.DataFrame()
 
+# Figures over the whole log depend only on the log version, while the
+# recent-events views also depend on the slider, so a slider change only
+# recomputes the small tail-based pieces. Every cache is bounded: a live
+# log changes version on nearly every write and old versions are never
+# shown again.
+
+@st.cache_data(show_spinner=False, max_entries=1)
+def timeline_fig(mtime):
+    """Histogram of all events over time"""
+    df = load_activity_log(mtime)
+    # Bin server-side so the figure carries one value per bin, not per event
+    counts = (df.groupby([pd.Grouper(key='timestamp', freq=TIMELINE_BIN), 'event_type'])
+                .size()
+                .unstack(fill_value=0))
+    fig = go.Figure([go.Bar(x=counts.index, y=counts[event_type], name=event_type)
+                     for event_type in counts.columns])  # One trace per event type
+    fig.update_layout(title='File Events Over Time', barmode='stack')
+    return fig
+
+@st.cache_data(show_spinner=False, max_entries=1)
+def event_type_fig(mtime):
+    """Pie chart of event types across the whole log"""
+    event_counts = load_activity_log(mtime)['event_type'].value_counts()
+    return px.pie(values=event_counts.values, 
+                  names=event_counts.index, 
+                  title='Distribution of Event Types')
+
+@st.cache_data(show_spinner=False, max_entries=SLIDER_CACHE_ENTRIES)
+def recent_slice(mtime, n):
+    """Last ``n`` events of the log"""
+    return load_activity_log(mtime).tail(n)
+
+@st.cache_data(show_spinner=False, max_entries=SLIDER_CACHE_ENTRIES)
+def extension_fig(mtime, n):
+    """Bar chart of file extensions among the last ``n`` events"""
+    recent_df = recent_slice(mtime, n)
+    extensions = recent_df['path'].str.extract(r'(?<=[^/\\])(\.[^./\\]*)$', expand=False).fillna('')
+    ext_counts = extensions.value_counts()
+    return px.bar(x=ext_counts.index, 
+                  y=ext_counts.values,
+                  title='File Extensions Distribution',
+                  labels={'x': 'Extension', 'y': 'Count'})
+
 def main():
     st.title("Ransomware Detection Monitor")
     
@@ -28,54 +92,45 @@ def main():
     refresh_rate = st.sidebar.slider("Refresh rate (seconds)", 1, 10, 5)
     
     # Load and process data
-    df = load_activity_log()
+    mtime = get_log_mtime()
+    df = load_activity_log(mtime)
     
     if not df.empty:
-        # Convert timestamps
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
-        
         # Basic metrics
+        event_counts = df['event_type'].value_counts()
         col1, col2, col3 = st.columns(3)
         with col1:
             st.metric("Total Events", len(df))
         with col2:
-            created_count = len(df[df['event_type'] == 'created'])
+            created_count = int(event_counts.get('created', 0))
             st.metric("Files Created", created_count)
         with col3:
-            modified_count = len(df[df['event_type'] == 'modified'])
+            modified_count = int(event_counts.get('modified', 0))
             st.metric("Files Modified", modified_count)
         
         # Timeline
         st.subheader("Activity Timeline")
-        fig = px.histogram(df, 
-                         x='timestamp', 
-                         title='File Events Over Time',
-                         color='event_type',  # Color bars by event type
-                         nbins=50)  # Adjust number of bins
-        st.plotly_chart(fig)
+        st.plotly_chart(timeline_fig(mtime))
         
         # Event type distribution
         st.subheader("Event Type Distribution")
-        event_counts = df['event_type'].value_counts()
-        fig2 = px.pie(values=event_counts.values, 
-                     names=event_counts.index, 
-                     title='Distribution of Event Types')
-        st.plotly_chart(fig2)
+        st.plotly_chart(event_type_fig(mtime))
         
         # Recent events
         st.subheader(f"Recent Events (Last {events_to_show})")
-        recent_df = df.tail(events_to_show)
-        st.dataframe(recent_df, use_container_width=True)
+        st.dataframe(recent_slice(mtime, events_to_show), use_container_width=True)
         
         # File extension analysis
         st.subheader("File Extension Analysis")
-        extensions = recent_df['path'].apply(lambda x: os.path.splitext(x)[1])
-        ext_counts = extensions.value_counts()
-        fig3 = px.bar(x=ext_counts.index, 
-                     y=ext_counts.values,
-                     title='File Extensions Distribution',
-                     labels={'x': 'Extension', 'y': 'Count'})
-        st.plotly_chart(fig3)
+        st.plotly_chart(extension_fig(mtime, events_to_show))
+        
+        # Threat analysis over the events the analyzer keeps loaded
+        st.subheader("Threat Analysis")
+        threats = analyze_threats_cached(LOG_FILE, mtime)
+        if threats:
+            st.dataframe(pd.DataFrame(threats[:MAX_THREATS_SHOWN]), use_container_width=True)
+        else:
+            st.success("No threats detected")
     else:
         st.info("No data available")
     
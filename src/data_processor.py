@@ -1,14 +1,111 @@
 import pandas as pd
 import numpy as np
 from pathlib import Path
+import concurrent.futures
+import multiprocessing
+import os
 import logging
-from typing import List, Dict, Tuple, Generator
-import json
-from datetime import datetime
+from typing import List, Dict, Tuple, Generator, Optional
+import orjson
 import psutil
 import itertools
+import collections
 from tqdm import tqdm
 
+# Size hint in bytes for each block of lines read from a log file
+READ_BLOCK_SIZE = 1 << 16
+
+# Column names of the values parsed from each log type, in tuple order
+LOG_FIELDS = {
+    "DNSinfo.txt": ('timestamp', 'src_ip', 'dst_ip', 'dns_query', 'response'),
+    "TCPconnInfo.txt": ('timestamp', 'src_ip', 'dst_ip', 'src_port', 'dst_port', 'smb_command'),
+    "IOops.txt": ('timestamp', 'operation', 'file_path'),
+}
+
+def _decode_line(raw: bytes) -> str:
+    """Decode one log line as UTF-8, falling back to latin1, which accepts any byte sequence"""
+    try:
+        return raw.decode('utf-8')
+    except UnicodeDecodeError:
+        return raw.decode('latin1')
+
+def _prefetch(file_path: Path):
+    """
+    Ask the kernel to start reading a log file into the page cache, so the
+    read overlaps with parsing the previous file. A no-op where
+    posix_fadvise is unavailable (Windows, macOS).
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        fd = os.open(file_path, os.O_RDONLY)
+    except OSError:
+        return  # Reported when the file is actually parsed
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    finally:
+        os.close(fd)
+
+# Log files handed to a worker per task, amortizing pickling and IPC
+FILES_PER_TASK = 8
+
+# Low-cardinality string columns whose repeated values share one object
+SHARED_VALUE_COLUMNS = {'src_ip', 'dst_ip', 'smb_command', 'operation'}
+
+# One parser per log type, picked once per file so the per-line path has
+# no log type dispatch. Lines whose first field is not a plain decimal
+# timestamp (headers, blank lines, TCP lines starting with an address)
+# give None; the isdecimal test guarantees float() succeeds.
+
+def _parse_dns_line(line: str) -> Optional[Tuple]:
+    """Parse a DNSinfo.txt line"""
+    fields = line.split()
+    if len(fields) < 3 or not fields[0].replace('.', '', 1).isdecimal():
+        return None
+    return (
+        float(fields[0]),
+        fields[1].split(':')[0],
+        fields[2].split(':')[0],
+        fields[4] if len(fields) > 4 else None,
+        fields[5] if len(fields) > 5 else None
+    )
+
+def _parse_tcp_line(line: str) -> Optional[Tuple]:
+    """Parse a TCPconnInfo.txt line; a non-integer port rejects the line"""
+    fields = line.split()
+    if len(fields) < 3 or not fields[0].replace('.', '', 1).isdecimal():
+        return None
+    try:
+        src_parts = fields[1].split(':')
+        dst_parts = fields[2].split(':')
+        return (
+            float(fields[0]),
+            src_parts[0],
+            dst_parts[0],
+            int(src_parts[1]) if len(src_parts) > 1 else None,
+            int(dst_parts[1]) if len(dst_parts) > 1 else None,
+            fields[3] if len(fields) > 3 else None
+        )
+    except ValueError:
+        return None
+
+def _parse_io_line(line: str) -> Optional[Tuple]:
+    """Parse an IOops.txt line; the file path is the rest of the line"""
+    fields = line.split(None, 2)
+    if len(fields) < 2 or not fields[0].replace('.', '', 1).isdecimal():
+        return None
+    return (
+        float(fields[0]),
+        fields[1],
+        fields[2].rstrip() if len(fields) > 2 else None
+    )
+
+LINE_PARSERS = {
+    "DNSinfo.txt": _parse_dns_line,
+    "TCPconnInfo.txt": _parse_tcp_line,
+    "IOops.txt": _parse_io_line,
+}
+
 class RansomwareLogProcessor:
     def __init__(self, nat_dir: str, original_dir: str, chunk_size: int = 1000):
         """
@@ -43,152 +140,167 @@ class RansomwareLogProcessor:
         if memory_gb > 1.0:  # Warning at 1GB
             self.logger.warning(f"High memory usage detected: {memory_gb:.2f}GB")
             
-    def parse_log_line(self, line: str, log_type: str) -> Dict:
-        """Parse a single log line based on log type"""
+    def parse_log_line(self, line: str, log_type: str) -> Optional[Tuple]:
+        """Parse a single log line into a tuple of its LOG_FIELDS values"""
+        parser = LINE_PARSERS.get(log_type)
+        return parser(line) if parser else None
+
+    def process_file_chunks(self, file_path: Path) -> Generator[Dict[str, List], None, None]:
+        """Process a file in chunks using a generator; each chunk maps column name -> values"""
+        parser = LINE_PARSERS.get(file_path.name)
+        if parser is None:
+            return
+        
         try:
-            if not line.strip() or line.startswith('Timestamp') or 'IP_src' in line:
-                return None
-                
-            fields = line.strip().split()
-            if not fields:
-                return None
-            
-            try:
-                timestamp = float(fields[0])
-            except ValueError:
-                return None
+            with open(file_path, 'rb') as f:
+                # Read blocks of lines and drive the decoding and the parser
+                # with map/filter so the per-line loop runs in C rather than
+                # the interpreter. Lines are decoded one by one, so a file is
+                # read once and a stray latin1 byte only affects its own line
+                lines = itertools.chain.from_iterable(iter(lambda: f.readlines(READ_BLOCK_SIZE), []))
+                rows = filter(None, map(parser, map(_decode_line, lines)))
                 
-            if log_type == "DNSinfo.txt":
-                if len(fields) < 3:
-                    return None
-                return {
-                    'timestamp': timestamp,
-                    'src_ip': fields[1].split(':')[0],
-                    'dst_ip': fields[2].split(':')[0],
-                    'dns_query': fields[4] if len(fields) > 4 else None,
-                    'response': fields[5] if len(fields) > 5 else None
-                }
-                
-            elif log_type == "TCPconnInfo.txt":
-                if len(fields) < 3:
-                    return None
-                try:
-                    src_parts = fields[1].split(':')
-                    dst_parts = fields[2].split(':')
-                    return {
-                        'timestamp': timestamp,
-                        'src_ip': src_parts[0],
-                        'dst_ip': dst_parts[0],
-                        'src_port': int(src_parts[1]) if len(src_parts) > 1 else None,
-                        'dst_port': int(dst_parts[1]) if len(dst_parts) > 1 else None,
-                        'smb_command': fields[3] if len(fields) > 3 else None
-                    }
-                except (IndexError, ValueError):
-                    return None
+                for chunk in iter(lambda: list(itertools.islice(rows, self.chunk_size)), []):
+                    # Transpose the row tuples into one list per column
+                    yield dict(zip(LOG_FIELDS[file_path.name], map(list, zip(*chunk))))
                     
-            elif log_type == "IOops.txt":
-                if len(fields) < 2:
-                    return None
-                return {
-                    'timestamp': timestamp,
-                    'operation': fields[1] if len(fields) > 1 else None,
-                    'file_path': ' '.join(fields[2:]) if len(fields) > 2 else None
-                }
-                
         except Exception as e:
-            self.logger.error(f"Error parsing line: {line}")
-            self.logger.error(f"Error details: {str(e)}")
-            return None
+            self.logger.error(f"Error processing {file_path}: {str(e)}")
 
-    def process_file_chunks(self, file_path: Path) -> Generator[Dict, None, None]:
-        """Process a file in chunks using a generator"""
-        encodings = ['utf-8', 'latin1', 'cp1252']
-        
-        for encoding in encodings:
-            try:
-                with open(file_path, 'r', encoding=encoding) as f:
-                    chunk = []
-                    for line in f:
-                        parsed_line = self.parse_log_line(line, file_path.name)
-                        if parsed_line:
-                            chunk.append(parsed_line)
-                            
-                            if len(chunk) >= self.chunk_size:
-                                yield chunk
-                                chunk = []
-                                self.check_memory_usage()
-                    
-                    if chunk:  # Yield remaining data
-                        yield chunk
-                break  # If successful, break the encoding loop
-                
-            except UnicodeDecodeError:
-                continue
-            except Exception as e:
-                self.logger.error(f"Error processing {file_path}: {str(e)}")
-                break
-
-    def save_chunk_to_temp(self, chunk: List[Dict], family: str, scenario: str, log_type: str):
-        """Save a chunk of processed data to a temporary file"""
-        temp_file = self.temp_dir / f"{scenario}_{family}_{log_type}_{datetime.now().timestamp()}.json"
-        with open(temp_file, 'w') as f:
-            json.dump({
-                'scenario': scenario,
-                'family': family,
-                'log_type': log_type,
-                'data': chunk
-            }, f)
-
-    def process_directory(self, directory: Path, scenario: str) -> None:
-        """Process all log files in a directory"""
-        log_types = ["DNSinfo.txt", "IOops.txt", "TCPconnInfo.txt"]
-        
-        for log_type in log_types:
-            log_files = list(directory.glob(f"**/{log_type}"))
-            
-            for file_path in tqdm(log_files, desc=f"Processing {log_type} files"):
-                family = file_path.parent.name
-                
-                for chunk in self.process_file_chunks(file_path):
-                    self.save_chunk_to_temp(chunk, family, scenario, log_type)
-
-    def merge_temp_files(self) -> Dict:
-        """Merge all temporary files into final result"""
-        results = {
-            'nat_scenario': {},
-            'original_scenario': {}
-        }
-        
-        for temp_file in self.temp_dir.glob('*.json'):
-            with open(temp_file, 'r') as f:
-                data = json.load(f)
-                scenario = data['scenario']
-                family = data['family']
-                
-                if family not in results[scenario]:
-                    results[scenario][family] = []
-                    
-                results[scenario][family].extend(data['data'])
+    def process_file(self, file_path: Path, temp_file: Path) -> Optional[str]:
+        """
+        Parse one log file into a temporary JSONL file inside a pool worker.
+        
+        The file is streamed sequentially and each chunk is appended as one
+        line of a single JSON-lines file by the worker, so only the temp
+        file path travels back over IPC.
+        
+        Args:
+            file_path (Path): Log file to parse
+            temp_file (Path): Temporary JSONL file to write the chunks to
             
-            temp_file.unlink()  # Delete temp file after processing
+        Returns:
+            Path of the temporary JSONL file, or None if no records were parsed
+        """
+        written = False
+        with open(temp_file, 'wb') as f:
+            for chunk in self.process_file_chunks(file_path):
+                f.write(orjson.dumps(chunk) + b'\n')  # One chunk of columns per line
+                written = True
+        if not written:
+            temp_file.unlink()
+            return None
+        return str(temp_file)
+
+    def process_file_batch(self, file_paths: List[str], temp_files: List[Path]) -> List[Optional[str]]:
+        """
+        Parse several log files inside a single worker task.
+        
+        Args:
+            file_paths (List[str]): Log files to parse
+            temp_files (List[Path]): Temporary JSONL file for each log file
             
+        Returns:
+            Temporary file path, or None, for each log file
+        """
+        results = []
+        for i, (file_path, temp_file) in enumerate(zip(file_paths, temp_files)):
+            if i + 1 < len(file_paths):
+                _prefetch(file_paths[i + 1])  # Readahead runs while this file parses
+            results.append(self.process_file(Path(file_path), temp_file))
+        return results
+
+    def read_temp_file(self, temp_file: str, columns: Dict[str, List]):
+        """Append the column chunks of a temporary JSONL file to ``columns`` and delete it"""
+        # Decoding makes a new str per value; map the few distinct IPs and
+        # commands onto one shared object each, like sys.intern but None-safe
+        shared = {name: {} for name in SHARED_VALUE_COLUMNS}
+        with open(temp_file, 'rb') as f:
+            for line in f:
+                for name, values in orjson.loads(line).items():
+                    if name not in columns:
+                        columns[name] = []
+                    if name in shared:
+                        values = map(shared[name].setdefault, values, values)
+                    columns[name].extend(values)
+        Path(temp_file).unlink()
+
+    def create_executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        """Create the process pool used to parse log files"""
+        # Parsing is CPU-bound Python, so threads would serialize on the GIL
+        mp_context = None
+        if 'fork' in multiprocessing.get_all_start_methods():
+            mp_context = multiprocessing.get_context('fork')
+        
+        # Leave one core for the coordinating process
+        max_workers = max(1, (os.cpu_count() or 1) - 1)
+        return concurrent.futures.ProcessPoolExecutor(max_workers=max_workers,
+                                                      mp_context=mp_context)
+
+    def process_directory(self, directory: Path, scenario: str) -> Dict:
+        """Process all log files in a directory in parallel"""
+        with self.create_executor() as executor:
+            return self._run(executor, directory, scenario)
+
+    def _run(self, executor: concurrent.futures.Executor, directory: Path, scenario: str) -> Dict:
+        """
+        Process all log files in a directory on an existing executor.
+        
+        Returns:
+            Dictionary mapping ransomware family -> log type -> column name
+            -> list of parsed values
+        """
+        # One walk of the tree finds every log type. Paths stay strings as
+        # os.walk yields them; the worker builds the Path it reads from.
+        log_files = [(os.path.join(root, name), os.path.basename(root), name)
+                     for root, _, files in os.walk(directory)
+                     for name in files if name in LINE_PARSERS]
+        
+        # Number temp files per (scenario, family, log type) so two logs with
+        # the same family directory name never write to the same file
+        seq = collections.defaultdict(itertools.count)
+        temp_paths = []
+        for _, family, log_type in log_files:
+            key = (scenario, family, log_type)
+            temp_paths.append(self.temp_dir / f"{'_'.join(key)}_{next(seq[key]):08d}.jsonl")
+        
+        file_paths = [file_path for file_path, _, _ in log_files]
+        file_batches = [file_paths[i:i + FILES_PER_TASK]
+                        for i in range(0, len(file_paths), FILES_PER_TASK)]
+        temp_batches = [temp_paths[i:i + FILES_PER_TASK]
+                        for i in range(0, len(temp_paths), FILES_PER_TASK)]
+        
+        results = {}
+        temp_files = itertools.chain.from_iterable(
+            executor.map(self.process_file_batch, file_batches, temp_batches))
+        for (_, family, log_type), temp_file in zip(log_files, tqdm(temp_files, total=len(log_files),
+                                                                    desc=f"Processing {scenario} files")):
+            if temp_file is None:
+                continue
+            if family not in results:
+                results[family] = {}
+            if log_type not in results[family]:
+                results[family][log_type] = {}
+            self.read_temp_file(temp_file, results[family][log_type])
+            self.check_memory_usage()  # Once per file, where the results grow
+        
         return results
 
     def process_all(self) -> Dict:
         """Process both NAT and original scenario directories"""
         self.logger.info("Starting processing of all log files...")
         
-        # Process directories
-        self.process_directory(self.nat_dir, 'nat_scenario')
-        self.process_directory(self.original_dir, 'original_scenario')
-        
-        # Merge results
-        results = self.merge_temp_files()
+        # Process directories; one pool serves both scenarios
+        with self.create_executor() as executor:
+            results = {
+                'nat_scenario': self._run(executor, self.nat_dir, 'nat_scenario'),
+                'original_scenario': self._run(executor, self.original_dir, 'original_scenario')
+            }
         
-        # Save final results
+        # Save final results; compact, since indenting the column lists
+        # puts every value on its own line
         output_file = 'processed_ransomware_data.json'
-        with open(output_file, 'w') as f:
-            json.dump(results, f, indent=2, default=str)
+        Path(output_file).write_bytes(orjson.dumps(results, option=orjson.OPT_NON_STR_KEYS))
         
         # Clean up temp directory
         self.temp_dir.rmdir()
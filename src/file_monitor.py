@@ -1,29 +1,61 @@
 import pandas as pd
-import json
+import orjson
 import os
 import logging
-from datetime import datetime
-from typing import Dict, List
+import queue
+import threading
+import time
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
+# Readers of the log written here, kept importable from this module
+from activity_log import read_events, read_new_events
+
+# Events buffered between the watchdog thread and the log writer
+EVENT_QUEUE_SIZE = 100_000
+
+# Most events serialized into a single write to the log
+WRITE_BATCH_SIZE = 1024
+
+# Seconds between fsyncs of the log while events are being written
+SYNC_INTERVAL = 1.0
+
+# Diagnostic log of the monitor itself
+MONITOR_LOG_FILE = 'file_monitor.log'
+
+# Queued by close() to stop the writer thread
+_STOP = object()
 
 class FileEventHandler(FileSystemEventHandler):
     def __init__(self, log_file: str):
         self.log_file = log_file
-        self.events = []
+        # Writes to the monitor's own logs raise events of their own; when
+        # they sit in the watched tree they would feed back into the log
+        self._own_files = {os.path.abspath(log_file), os.path.abspath(MONITOR_LOG_FILE)}
         # Set up logging
         self.logger = self._setup_logger()
         self._ensure_log_file()
+        # Append-only JSON lines log, one event per line. The watchdog thread
+        # only enqueues; a writer thread serializes batches of events and
+        # writes each batch unbuffered, normally in a single write.
+        self._fp = open(self.log_file, 'ab', buffering=0)
+        self._queue = queue.Queue(maxsize=EVENT_QUEUE_SIZE)
+        self._writer = threading.Thread(target=self._writer_loop, name='FileMonitorWriter',
+                                        daemon=True)
+        self._writer.start()
         self.logger.info(f"FileEventHandler initialized with log file: {log_file}")
     
     def _setup_logger(self) -> logging.Logger:
         """Set up a logger for the file monitor"""
         logger = logging.getLogger('FileMonitor')
+        if logger.handlers:
+            return logger  # Already configured by an earlier handler
         logger.setLevel(logging.INFO)
         
-        # Create handlers
+        # Create handlers; the console only shows problems
         console_handler = logging.StreamHandler()
-        file_handler = logging.FileHandler('file_monitor.log')
+        console_handler.setLevel(logging.WARNING)
+        file_handler = logging.FileHandler(MONITOR_LOG_FILE)
+        file_handler.setLevel(logging.INFO)
         
         # Create formatters and add it to handlers
         log_format = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
@@ -37,55 +69,97 @@ class FileEventHandler(FileSystemEventHandler):
         return logger
     
     def _ensure_log_file(self):
-        """Ensure the log file exists and has proper structure"""
+        """Ensure the log file exists and ends on a complete line"""
         try:
             if not os.path.exists(self.log_file):
                 self.logger.info(f"Creating new log file: {self.log_file}")
-                self._save_events()
-            else:
-                # Try to load existing events
-                try:
-                    with open(self.log_file, 'r') as f:
-                        data = json.load(f)
-                        self.events = data.get('events', [])
-                    self.logger.info(f"Loaded {len(self.events)} existing events")
-                except json.JSONDecodeError:
-                    self.logger.warning(f"Could not parse existing log file. Creating new one.")
-                    self._save_events()
+                open(self.log_file, 'wb').close()
+                return
+            
+            # Count existing events lazily, line by line
+            count = 0
+            complete_end = 0  # Offset just past the last complete line
+            with open(self.log_file, 'r+b') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # Torn last line
+                    complete_end += len(line)
+                    count += 1
+                
+                # Drop an event torn by a crash so the next one starts on a
+                # line of its own and readers never see the fragment
+                if f.tell() > complete_end:
+                    self.logger.warning("Dropping partial event line at the end of the log")
+                    f.truncate(complete_end)
+            self.logger.info(f"Found {count} existing events")
         except Exception as e:
             self.logger.error(f"Error in _ensure_log_file: {str(e)}")
             raise
     
-    def _save_events(self):
-        """Save events to log file with error handling"""
-        try:
-            with open(self.log_file, 'w') as f:
-                json.dump({'events': self.events}, f, indent=2)
-            self.logger.debug(f"Saved {len(self.events)} events to log file")
-        except Exception as e:
-            self.logger.error(f"Error saving events: {str(e)}")
-            raise
+    def _write_all(self, data: bytes):
+        """Write all of ``data``; the unbuffered file may accept only part of it per write"""
+        view = memoryview(data)
+        while view:
+            view = view[self._fp.write(view):]
+    
+    def _writer_loop(self):
+        """Drain the event queue into the log file until close() is called"""
+        last_sync = time.monotonic()
+        dirty = False
+        stopping = False
+        while not stopping:
+            # Block for the first event, then take whatever else is queued
+            try:
+                batch = [self._queue.get(timeout=SYNC_INTERVAL)]
+            except queue.Empty:
+                batch = []
+            while batch and len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            events = [event for event in batch if event is not _STOP]
+            stopping = len(events) < len(batch)
+            try:
+                if events:
+                    self._write_all(b''.join([orjson.dumps(event, option=orjson.OPT_APPEND_NEWLINE)
+                                              for event in events]))
+                    dirty = True
+                if dirty and (stopping or time.monotonic() - last_sync >= SYNC_INTERVAL):
+                    os.fsync(self._fp.fileno())
+                    last_sync = time.monotonic()
+                    dirty = False
+            except Exception as e:
+                self.logger.error(f"Error writing events: {str(e)}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
     
     def on_any_event(self, event):
         """Handle any file system event"""
-        if event.is_directory:
+        if event.is_directory or os.path.abspath(event.src_path) in self._own_files:
             return
         
         try:
             event_data = {
-                'timestamp': datetime.now().timestamp(),
+                'timestamp': time.time_ns(),  # Integer epoch nanoseconds
                 'event_type': event.event_type,
                 'path': event.src_path,
                 'is_directory': event.is_directory
             }
             
-            self.events.append(event_data)
-            self._save_events()
+            self._queue.put_nowait(event_data)
             
-            self.logger.info(
-                f"Event logged - Type: {event.event_type}, "
-                f"Path: {event.src_path}"
-            )
+            # Events are recorded in the activity log; echoing each one is
+            # debug output, formatted only when it will be emitted
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug(
+                    f"Event logged - Type: {event.event_type}, "
+                    f"Path: {event.src_path}"
+                )
+        except queue.Full:
+            self.logger.warning(f"Event queue full, dropped event for {event.src_path}")
         except Exception as e:
             self.logger.error(f"Error processing event: {str(e)}")
     
@@ -100,16 +174,49 @@ class FileEventHandler(FileSystemEventHandler):
             self.logger.info("Created test file")
             
             # Read current log
-            with open(self.log_file, 'r') as f:
-                log_data = json.load(f)
-                self.logger.info(f"Current log contains {len(log_data['events'])} events")
+            self.flush()
+            with open(self.log_file, 'rb') as f:
+                count = sum(1 for _ in f)
+            self.logger.info(f"Current log contains {count} events")
                 
             return True
         except Exception as e:
             self.logger.error(f"Test logging failed: {str(e)}")
             return False
+    
+    def flush(self):
+        """Block until every event queued so far has been written to the log"""
+        self._queue.join()
+    
+    def close(self):
+        """Write the remaining events, fsync and close the log file"""
+        self._queue.put(_STOP)
+        self._writer.join()
+        self._fp.close()
+
+def compact_log(log_file: str) -> int:
+    """
+    Rewrite the activity log without blank or undecodable lines, such as a
+    partial event left by a crash. Meant to run out-of-band while no
+    FileEventHandler is appending to the file.
+    
+    Returns:
+        Number of events kept
+    """
+    temp_file = log_file + '.tmp'
+    kept = 0
+    with open(log_file, 'rb') as src, open(temp_file, 'wb') as dst:
+        for line in src:
+            try:
+                orjson.loads(line)
+            except orjson.JSONDecodeError:
+                continue
+            dst.write(line if line.endswith(b'\n') else line + b'\n')
+            kept += 1
+    os.replace(temp_file, log_file)
+    return kept
 
-def setup_monitoring(watch_directory: str, log_file: str = 'activity_log.json'):
+def setup_monitoring(watch_directory: str, log_file: str = 'activity_log.jsonl'):
     """Set up file system monitoring"""
     try:
         # Set up the event handler
@@ -136,12 +243,15 @@ if __name__ == "__main__":
         if handler.test_logging():
             print("Logging test successful")
         
+        # Sleep on the observer thread instead of spinning; the timeout lets
+        # Ctrl+C through on platforms where a plain join() is uninterruptible
         try:
-            while True:
-                pass
+            while observer.is_alive():
+                observer.join(timeout=1)
         except KeyboardInterrupt:
             observer.stop()
         observer.join()
+        handler.close()
         
     except Exception as e:
         print(f"Error: {str(e)}")
\ No newline at end of file
@@ -1,6 +1,7 @@
 # main.py
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 from datetime import datetime, timedelta
 import time
@@ -10,6 +11,18 @@ from monitor import setup_monitoring
 import logging
 import sqlite3
 
+# Most time buckets per event type drawn on the activity timeline
+MAX_TIMELINE_POINTS = 500
+
+@st.cache_resource
+def start_monitoring(watch_directory, db_file):
+    """
+    Start the observer and detector once per server process. Streamlit
+    reruns this script on every interaction and for every browser session;
+    each extra observer would insert every log line into the database again.
+    """
+    return setup_monitoring(watch_directory, db_file)
+
 class RansomwareMonitor:
     def __init__(self):
         # Configure logging
@@ -39,7 +52,7 @@ class RansomwareMonitor:
             
         # Set up detector only once
         if 'detector' not in st.session_state:
-            _, st.session_state.detector = setup_monitoring(
+            st.session_state.observer, st.session_state.detector = start_monitoring(
                 str(self.base_dir), 
                 str(self.db_file)
             )
@@ -49,22 +62,33 @@ class RansomwareMonitor:
         if not st.session_state.data_processed:
             with st.spinner("Processing log files... This may take a moment."):
                 try:
-                    for family_dir in self.nat_directory.iterdir():
-                        if family_dir.is_dir():
-                            for log_type in ["TCPconnInfo.txt", "IOops.txt", "DNSinfo.txt"]:
-                                log_file = family_dir / log_type
-                                if log_file.exists():
-                                    st.session_state.detector.process_log_file(str(log_file))
+                    # scandir entries know their type from the directory
+                    # read, so telling families from files needs no stat
+                    with os.scandir(self.nat_directory) as entries:
+                        family_dirs = [entry.path for entry in entries if entry.is_dir()]
+                    for family_dir in family_dirs:
+                        for log_type in ["TCPconnInfo.txt", "IOops.txt", "DNSinfo.txt"]:
+                            log_file = os.path.join(family_dir, log_type)
+                            if os.path.exists(log_file):
+                                st.session_state.detector.process_log_file(log_file)
                     st.session_state.data_processed = True
                     st.success("Data processing complete!")
                 except Exception as e:
                     st.error(f"Error processing files: {e}")
 
     @staticmethod
-    @st.cache_data(ttl=5)
-    def load_data(limit, current_time):
-        """Load and cache data from the database"""
-        return st.session_state.detector.get_events(limit=limit)
+    @st.cache_data(max_entries=8)
+    def load_data(limit, last_event_id):
+        """
+        Load and cache data from the database. Keyed on the newest event id,
+        so refreshes only query and rebuild the frame when events were added.
+        """
+        df = st.session_state.detector.get_events(limit=limit)
+        if not df.empty:
+            # Converted once per data version rather than on every rerun
+            df['time'] = pd.to_datetime(df['timestamp'], unit='s')
+            df['event_type'] = df['event_type'].astype('category')
+        return df
 
     def display_metrics(self, df):
         """Display key metrics"""
@@ -94,15 +118,19 @@ class RansomwareMonitor:
             return
 
         st.subheader("Activity Timeline")
-        df['time'] = pd.to_datetime(df['timestamp'], unit='s')
-        timeline = df.groupby([pd.Grouper(key='time', freq='1Min'), 'event_type']).size().reset_index(name='count')
+        # Widen the buckets beyond a minute on long spans so the chart sends
+        # at most MAX_TIMELINE_POINTS points per event type to the browser
+        timespan = df['timestamp'].max() - df['timestamp'].min()
+        bucket = max(60, int(np.ceil(timespan / MAX_TIMELINE_POINTS)))
+        timeline = df.groupby([pd.Grouper(key='time', freq=f'{bucket}s'), 'event_type'],
+                             observed=True).size().reset_index(name='count')
         
         fig = px.line(timeline, x='time', y='count', color='event_type', 
                      title="Event Frequency Over Time")
         st.plotly_chart(fig, use_container_width=True)
 
-    def display_network_analysis(self, df):
-        """Display network analysis"""
+    def display_network_analysis(self, df, network_df):
+        """Display network analysis; ``network_df`` holds the network events of ``df``"""
         if df.empty:
             return
 
@@ -115,7 +143,6 @@ class RansomwareMonitor:
         st.plotly_chart(fig, use_container_width=True)
 
         # IP analysis
-        network_df = df[df['event_type'] == 'network']
         if not network_df.empty:
             col1, col2 = st.columns(2)
             
@@ -133,9 +160,8 @@ class RansomwareMonitor:
                            title="Top Destination IPs")
                 st.plotly_chart(fig, use_container_width=True)
 
-    def display_filesystem_activity(self, df):
+    def display_filesystem_activity(self, filesystem_df):
         """Display filesystem activity analysis"""
-        filesystem_df = df[df['event_type'] == 'filesystem']
         if filesystem_df.empty:
             return
 
@@ -160,13 +186,18 @@ class RansomwareMonitor:
         suspicious = df[df['timestamp'] > recent_time]
         
         if not suspicious.empty:
+            # itertuples yields plain tuples instead of boxing each row into a
+            # Series; the messages are rendered as one alert, newest first
+            messages = []
+            for event in suspicious.itertuples(index=False):
+                if event.event_type == 'network':
+                    messages.append(f"Network connection: {event.src_ip} → {event.dst_ip}")
+                elif event.event_type == 'filesystem':
+                    messages.append(f"File operation: {event.operation} on {event.path}")
+            
             with st.expander("Recent Suspicious Activities", expanded=True):
-                for _, event in suspicious.iterrows():
-                    event_type = event.get('event_type', 'unknown')
-                    if event_type == 'network':
-                        st.warning(f"Network connection: {event['src_ip']} → {event['dst_ip']}")
-                    elif event_type == 'filesystem':
-                        st.warning(f"File operation: {event['operation']} on {event['path']}")
+                if messages:
+                    st.warning("  \n".join(messages))
 
     def run(self):
         st.title("🛡️ Ransomware Detection Monitor")
@@ -194,18 +225,23 @@ class RansomwareMonitor:
         events_to_show = st.sidebar.slider("Events to display", 100, 1000, 500)
         
         # Load data
-        df = RansomwareMonitor.load_data(events_to_show, int(time.time()))
+        df = RansomwareMonitor.load_data(events_to_show,
+                                         st.session_state.detector.get_last_event_id())
         
         if not df.empty:
+            # Split the events by type once instead of masking per display
+            groups = dict(list(df.groupby('event_type', observed=True)))
+            no_events = df.iloc[:0]
+            
             # Display components
             self.display_metrics(df)
             self.display_timeline(df)
             
             col1, col2 = st.columns(2)
             with col1:
-                self.display_network_analysis(df)
+                self.display_network_analysis(df, groups.get('network', no_events))
             with col2:
-                self.display_filesystem_activity(df)
+                self.display_filesystem_activity(groups.get('filesystem', no_events))
             
             self.display_threat_analysis(df)
             
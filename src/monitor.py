@@ -1,7 +1,6 @@
 # monitor.py
 import os
 import time
-import json
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 import logging
@@ -11,6 +10,75 @@ from pathlib import Path
 import sqlite3
 import threading
 
+# Event fields stored in the events table, in column order
+EVENT_COLUMNS = ('timestamp', 'event_time', 'event_type', 'src_ip', 'dst_ip',
+                 'src_port', 'dst_port', 'command', 'operation', 'path', 'query')
+INSERT_EVENT_SQL = (f"INSERT INTO events ({', '.join(EVENT_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(EVENT_COLUMNS))})")
+
+# Log lines are parsed straight into rows of EVENT_COLUMNS values, one
+# parser per log type, so ingest builds no per-line dicts. A line whose
+# first field is not a timestamp (headers, blank lines) or that lacks the
+# fields its type needs gives None.
+
+def _parse_time(field):
+    """Timestamp and ISO event time of a timestamp field, or None"""
+    try:
+        timestamp = float(field)
+        return timestamp, datetime.fromtimestamp(timestamp).isoformat()
+    except (ValueError, OverflowError, OSError):
+        return None
+
+def _split_address(value):
+    """IP and integer port of an 'ip:port' field, or the field itself and None"""
+    ip, sep, port = value.partition(':')
+    # int() accepts any string of decimal digits, so no exception can occur
+    if sep and port.isdecimal():
+        return ip, int(port)
+    return value, None
+
+def _parse_tcp_line(line):
+    """Parse a TCPconnInfo.txt line into an events row"""
+    fields = line.split()
+    if len(fields) < 3:
+        return None
+    times = _parse_time(fields[0])
+    if times is None:
+        return None
+    src_ip, src_port = _split_address(fields[1])
+    dst_ip, dst_port = _split_address(fields[2])
+    return (*times, 'network', src_ip, dst_ip, src_port, dst_port,
+            fields[3] if len(fields) > 3 else None, None, None, None)
+
+def _parse_io_line(line):
+    """Parse an IOops.txt line into an events row"""
+    fields = line.split()
+    if not fields:
+        return None
+    times = _parse_time(fields[0])
+    if times is None:
+        return None
+    return (*times, 'filesystem', None, None, None, None, None,
+            fields[1] if len(fields) > 1 else None,
+            ' '.join(fields[2:]) if len(fields) > 2 else None, None)
+
+def _parse_dns_line(line):
+    """Parse a DNSinfo.txt line into an events row"""
+    fields = line.split()
+    if len(fields) < 3:
+        return None
+    times = _parse_time(fields[0])
+    if times is None:
+        return None
+    return (*times, 'dns', _split_address(fields[1])[0], _split_address(fields[2])[0],
+            None, None, None, None, None, fields[4] if len(fields) > 4 else None)
+
+LINE_PARSERS = {
+    "TCPconnInfo.txt": _parse_tcp_line,
+    "IOops.txt": _parse_io_line,
+    "DNSinfo.txt": _parse_dns_line,
+}
+
 class RansomwareDetector:
     def __init__(self, watch_directory, db_file='src/activity.db'):
         self.watch_directory = watch_directory
@@ -18,6 +86,12 @@ class RansomwareDetector:
         self.alert_threshold = 10
         self.suspicious_extensions = {'.encrypted', '.crypto', '.locked', '.decrypt'}
         self.lock = threading.Lock()
+        self.read_lock = threading.Lock()
+        
+        # Bytes of each log file already stored; log files only grow, so a
+        # change event ingests just the lines appended since the last one
+        self.file_offsets = {}
+        self.ingest_lock = threading.Lock()
         
         # Set up logging
         logging.basicConfig(level=logging.INFO)
@@ -26,11 +100,24 @@ class RansomwareDetector:
         # Initialize database
         self.init_database()
         
+        # Long-lived connections, shared by the observer thread and Streamlit
+        # reruns: one for inserts (under self.lock) and one in autocommit for
+        # queries (under self.read_lock), so reads never run inside the
+        # writer's open transaction and see each commit as it lands
+        self.write_conn = self._connect()
+        self.read_conn = self._connect(isolation_level=None)
+        # Let SQLite read pages through its own mmap and keep a larger cache
+        self.read_conn.execute('PRAGMA mmap_size=268435456')
+        self.read_conn.execute('PRAGMA cache_size=-65536')
+        
     def init_database(self):
         """Initialize SQLite database for storing events"""
         try:
             os.makedirs(os.path.dirname(self.db_file), exist_ok=True)
             with sqlite3.connect(self.db_file) as conn:
+                # Write-ahead logging lets the dashboard read while log files
+                # are being inserted; the mode is persistent in the database
+                conn.execute('PRAGMA journal_mode=WAL')
                 conn.execute('''
                     CREATE TABLE IF NOT EXISTS events (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -47,142 +134,127 @@ class RansomwareDetector:
                         query TEXT
                     )
                 ''')
+                # Recent-activity counts and newest-first reads become a range
+                # lookup on the sorted timestamps instead of a full table scan
+                conn.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_events_timestamp
+                    ON events (timestamp)
+                ''')
                 conn.commit()
         except Exception as e:
             self.logger.error(f"Error initializing database: {e}")
 
+    def _connect(self, **kwargs):
+        """Open a connection to the event database usable from any thread"""
+        conn = sqlite3.connect(self.db_file, check_same_thread=False, **kwargs)
+        # In WAL mode NORMAL only syncs at checkpoints and stays corruption-safe
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def add_rows(self, rows):
+        """
+        Insert an iterable of EVENT_COLUMNS value tuples in a single
+        transaction. If iterating ``rows`` raises, the transaction is rolled
+        back and the error is propagated, so none of the rows are stored.
+        """
+        with self.lock:
+            with self.write_conn as conn:
+                conn.executemany(INSERT_EVENT_SQL, rows)
+
+    def add_events(self, events):
+        """Insert an iterable of event dicts in a single transaction"""
+        self.add_rows(tuple(map(event.get, EVENT_COLUMNS)) for event in events)
+
     def add_event(self, event):
         """Add a single event to the database"""
         try:
-            with self.lock:
-                with sqlite3.connect(self.db_file) as conn:
-                    conn.execute('''
-                        INSERT INTO events (
-                            timestamp, event_time, event_type, src_ip, dst_ip,
-                            src_port, dst_port, command, operation, path, query
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        event.get('timestamp'),
-                        event.get('event_time'),
-                        event.get('event_type'),
-                        event.get('src_ip'),
-                        event.get('dst_ip'),
-                        event.get('src_port'),
-                        event.get('dst_port'),
-                        event.get('command'),
-                        event.get('operation'),
-                        event.get('path'),
-                        event.get('query')
-                    ))
-                    conn.commit()
+            self.add_events([event])
         except Exception as e:
             self.logger.error(f"Error adding event to database: {e}")
 
     def get_events(self, limit=1000):
         """Get events from database as pandas DataFrame"""
         try:
-            with sqlite3.connect(self.db_file) as conn:
+            with self.read_lock:
                 return pd.read_sql_query(
                     'SELECT * FROM events ORDER BY timestamp DESC LIMIT ?',
-                    conn,
+                    self.read_conn,
                     params=(limit,)
                 )
         except Exception as e:
             self.logger.error(f"Error getting events from database: {e}")
             return pd.DataFrame()
 
+    def get_last_event_id(self):
+        """Id of the newest event, 0 when there are none; changes whenever events are added"""
+        try:
+            with self.read_lock:
+                return self.read_conn.execute('SELECT MAX(id) FROM events').fetchone()[0] or 0
+        except Exception as e:
+            self.logger.error(f"Error getting last event id: {e}")
+            return None
+
     def extract_ip_port(self, ip_port_str):
         """Safely extract IP and port from string"""
-        try:
-            if ':' in ip_port_str:
-                ip, port = ip_port_str.split(':')
-                return ip, int(port)
-            return ip_port_str, None
-        except Exception:
-            return ip_port_str, None
+        return _split_address(ip_port_str)
 
     def process_log_line(self, line, log_type):
-        """Process a single log line based on type"""
-        try:
-            if not line.strip() or line.startswith('Timestamp') or 'IP_src' in line:
-                return None
+        """Process a single log line based on type into an event dict"""
+        parser = LINE_PARSERS.get(log_type)
+        row = parser(line) if parser else None
+        return dict(zip(EVENT_COLUMNS, row)) if row else None
 
-            fields = line.strip().split()
-            if not fields:
-                return None
-
-            try:
-                timestamp = float(fields[0])
-            except ValueError:
-                return None
-
-            event = {
-                'timestamp': timestamp,
-                'event_time': datetime.fromtimestamp(timestamp).isoformat()
-            }
-
-            if log_type == "TCPconnInfo.txt":
-                src_ip, src_port = self.extract_ip_port(fields[1])
-                dst_ip, dst_port = self.extract_ip_port(fields[2])
-                
-                event.update({
-                    'event_type': 'network',
-                    'src_ip': src_ip,
-                    'dst_ip': dst_ip,
-                    'src_port': src_port,
-                    'dst_port': dst_port,
-                    'command': fields[3] if len(fields) > 3 else None
-                })
-            elif log_type == "IOops.txt":
-                event.update({
-                    'event_type': 'filesystem',
-                    'operation': fields[1] if len(fields) > 1 else None,
-                    'path': ' '.join(fields[2:]) if len(fields) > 2 else None
-                })
-            elif log_type == "DNSinfo.txt":
-                src_ip, _ = self.extract_ip_port(fields[1])
-                dst_ip, _ = self.extract_ip_port(fields[2])
-                
-                event.update({
-                    'event_type': 'dns',
-                    'src_ip': src_ip,
-                    'dst_ip': dst_ip,
-                    'query': fields[4] if len(fields) > 4 else None
-                })
-            
-            return event
-            
-        except Exception as e:
-            self.logger.error(f"Error processing log line: {e}")
-            return None
-
-    def process_log_file(self, file_path):
-        """Process a log file and add events to database"""
-        encodings = ['utf-8', 'latin1', 'cp1252', 'iso-8859-1']
+    def process_log_file(self, file_path, wait_for_newline=False):
+        """
+        Add the lines appended to a log file since it was last processed to
+        the database, in one transaction.
         
-        for encoding in encodings:
+        Lines are decoded as UTF-8, falling back to latin1 for lines that
+        are not valid UTF-8. With ``wait_for_newline`` an unterminated last
+        line is left for a later call, as the writer may still be appending it.
+        """
+        parser = LINE_PARSERS.get(os.path.basename(file_path))
+        if parser is None:
+            return
+        key = os.path.abspath(file_path)
+        
+        with self.ingest_lock:
             try:
-                log_type = os.path.basename(file_path)
-                with open(file_path, 'r', encoding=encoding) as f:
-                    next(f, None)  # Skip header
+                with open(file_path, 'rb') as f:
+                    offset = self.file_offsets.get(key, 0)
+                    if os.fstat(f.fileno()).st_size < offset:
+                        offset = 0  # Truncated or replaced; start over
+                    f.seek(offset)
+                    
+                    consumed = 0
+                    def new_lines():
+                        nonlocal consumed
+                        for raw in f:
+                            if wait_for_newline and not raw.endswith(b'\n'):
+                                return
+                            consumed += len(raw)
+                            try:
+                                yield raw.decode('utf-8')
+                            except UnicodeDecodeError:
+                                yield raw.decode('latin1')
+                    
+                    lines = new_lines()
+                    if offset == 0:
+                        next(lines, None)  # Skip header
+                    
+                    # The offset only advances once the transaction commits
+                    self.add_rows(filter(None, map(parser, lines)))
+                    self.file_offsets[key] = offset + consumed
                     
-                    for line in f:
-                        event = self.process_log_line(line, log_type)
-                        if event:
-                            self.add_event(event)
-                return  # If successful, exit the encoding loop
-                
-            except UnicodeDecodeError:
-                continue
             except Exception as e:
-                self.logger.error(f"Error processing log file {file_path} with {encoding}: {e}")
+                self.logger.error(f"Error processing log file {file_path}: {e}")
 
     def check_suspicious_activity(self, event):
         """Check for suspicious activity patterns"""
         try:
-            with sqlite3.connect(self.db_file) as conn:
+            with self.read_lock:
                 # Check recent activity
-                recent_count = conn.execute('''
+                recent_count = self.read_conn.execute('''
                     SELECT COUNT(*) FROM events 
                     WHERE timestamp > ?
                 ''', (time.time() - 60,)).fetchone()[0]
@@ -215,7 +287,7 @@ class FileEventHandler(FileSystemEventHandler):
             
         file_name = os.path.basename(event.src_path)
         if file_name in ["TCPconnInfo.txt", "IOops.txt", "DNSinfo.txt"]:
-            self.detector.process_log_file(event.src_path)
+            self.detector.process_log_file(event.src_path, wait_for_newline=True)
 
     def on_modified(self, event):
         self.handle_event(event, 'modified')
@@ -231,7 +303,6 @@ def setup_monitoring(watch_directory, db_file='src/activity.db'):
         
         observer = Observer()
         observer.schedule(handler, watch_directory, recursive=True)
-        observer._handlers = {}  # Reset handlers to prevent duplicate scheduling
         observer.start()
         
         return observer, detector
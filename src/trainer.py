@@ -5,85 +5,120 @@ from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder
 import joblib
-from typing import Dict, List, Union
+import contextlib
+from typing import Dict, Iterator, List, Tuple, Union
 import logging
-from pathlib import Path
+import os
+import threading
+
+# Model features derived from RansomwareLogProcessor output, in column
+# order, and the key of each in a processed sample
+LOG_FEATURE_KEYS = {
+    'duration': 'duration_seconds',
+    'avg_packet_interval': 'avg_time_between_packets',
+    'unique_dst_ips': 'unique_dst_ips',
+    'unique_dst_ports': 'unique_dst_ports',
+    'bytes_sent_per_second': 'bytes_sent_per_second',
+    'avg_packet_size': 'avg_packet_size',
+    'packet_size_std': 'packet_size_std',
+}
+LOG_FEATURE_COLUMNS = tuple(LOG_FEATURE_KEYS)
+
+# Suffix of the last path component, matching pathlib's Path.suffix
+PATH_SUFFIX_PATTERN = r'(?<=[^/\\])(\.[^./\\]+)$'
+
+# Lowercase file extensions that mark an event as likely ransomware output
+SUSPICIOUS_EXTENSIONS = ['.encrypted', '.locked', '.crypto']
+
+# Module logger; logging is configured by the application, or by the
+# example at the bottom when this file is run directly
+logger = logging.getLogger(__name__)
+
+# Fewest samples predict_batch spreads over the trees on all cores; below
+# this, starting the threads costs more than the 100 trees take serially
+PARALLEL_PREDICT_MIN_SAMPLES = 100
+
+def _family_samples(family_data: Union[List[Dict], Dict[str, Dict[str, List]]]) -> Iterator[Dict]:
+    """
+    Samples of one family. The analyzer's RansomwareLogProcessor gives a
+    list of feature dicts; the data_processor one gives log type -> column
+    name -> values, read here as one sample per parsed line.
+    """
+    if isinstance(family_data, dict):
+        for columns in family_data.values():
+            names = list(columns)
+            for values in zip(*columns.values()):
+                yield dict(zip(names, values))
+    else:
+        yield from family_data
+
+def _log_samples(parsed_data: Dict) -> Tuple[List[str], List[Dict]]:
+    """Flatten RansomwareLogProcessor output into labels and non-empty samples"""
+    pairs = [(f"{scenario}_{family}", sample)
+             for scenario, families in parsed_data.items()
+             for family, family_data in families.items()
+             for sample in _family_samples(family_data) if sample]
+    return [label for label, _ in pairs], [sample for _, sample in pairs]
+
+def _sample_matrix(samples: List[Dict]) -> np.ndarray:
+    """Float32 feature matrix of log samples, one row each in LOG_FEATURE_COLUMNS order"""
+    return np.array([[sample.get(key, 0) for key in LOG_FEATURE_KEYS.values()]
+                     for sample in samples], dtype=np.float32)
 
 class RansomwareTrainer:
     def __init__(self, model_path: str = 'ransomware_model.joblib'):
         self.model_path = model_path
         self.model = None
         self.label_encoder = LabelEncoder()
-        self.setup_logging()
-        
-    def setup_logging(self):
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s'
-        )
-        self.logger = logging.getLogger(__name__)
+        self._load_lock = threading.Lock()
     
     def extract_features_from_logs(self, parsed_data: Dict) -> pd.DataFrame:
         """Extract features from parsed log data (NAT/original scenarios)"""
-        features_list = []
-        labels = []
-        
-        # Process each scenario
-        for scenario, families in parsed_data.items():
-            for family, samples in families.items():
-                for sample in samples:
-                    if not sample:  # Skip empty samples
-                        continue
-                    
-                    features = {
-                        'duration': sample.get('duration_seconds', 0),
-                        'avg_packet_interval': sample.get('avg_time_between_packets', 0),
-                        'unique_dst_ips': sample.get('unique_dst_ips', 0),
-                        'unique_dst_ports': sample.get('unique_dst_ports', 0),
-                        'bytes_sent_per_second': sample.get('bytes_sent_per_second', 0),
-                        'avg_packet_size': sample.get('avg_packet_size', 0),
-                        'packet_size_std': sample.get('packet_size_std', 0),
-                    }
-                    
-                    features_list.append(features)
-                    labels.append(f"{scenario}_{family}")
-        
-        return pd.DataFrame(features_list), labels
+        # Build each feature column as one numpy array instead of one dict
+        # per sample, so pandas has no per-row records to infer dtypes over
+        labels, samples = _log_samples(parsed_data)
+        features = pd.DataFrame({column: np.array([sample.get(key, 0) for sample in samples])
+                                 for column, key in LOG_FEATURE_KEYS.items()},
+                                columns=LOG_FEATURE_COLUMNS)
+        return features, labels
 
     def extract_features_from_events(self, df: pd.DataFrame) -> pd.DataFrame:
         """Extract features from real-time event data"""
         if df.empty:
             return pd.DataFrame()
         
-        # Group events by time windows (e.g., 1-minute windows)
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
-        windows = df.groupby(pd.Grouper(key='timestamp', freq='1Min'))
-        
-        features_list = []
-        for _, window in windows:
-            if window.empty:
-                continue
-                
-            features = {
-                'event_rate': len(window),
-                'modified_ratio': (window['event_type'] == 'modified').mean(),
-                'created_ratio': (window['event_type'] == 'created').mean(),
-                'unique_extensions': window['path'].apply(lambda x: Path(x).suffix).nunique(),
-                'suspicious_extensions': window['path'].apply(
-                    lambda x: Path(x).suffix.lower() in ['.encrypted', '.locked', '.crypto']
-                ).any(),
-            }
-            features_list.append(features)
-        
-        return pd.DataFrame(features_list)
+        # Extensions are extracted for the whole frame in one vectorized pass
+        # rather than per row and per window
+        extensions = df['path'].str.extract(PATH_SUFFIX_PATTERN, expand=False).fillna('')
+        suspicious = extensions.str.lower().isin(SUSPICIOUS_EXTENSIONS)
+        
+        # All window features come from one groupby aggregation over
+        # per-event flags instead of a Python loop over the windows. Keying
+        # on each event's minute only creates the windows that have
+        # events; a 1-minute Grouper builds a bin for every minute of the
+        # span, which dominates on sparse logs covering days.
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ns')
+        # Hash the event types once; both flags then compare integer codes
+        event_type = df['event_type'].astype('category')
+        features = (df.assign(extension=extensions, suspicious=suspicious,
+                              modified=event_type.eq('modified'),
+                              created=event_type.eq('created'))
+                      .groupby(df['timestamp'].dt.floor('1min'))
+                      .agg(event_rate=('suspicious', 'size'),
+                           modified_ratio=('modified', 'mean'),
+                           created_ratio=('created', 'mean'),
+                           unique_extensions=('extension', 'nunique'),
+                           suspicious_extensions=('suspicious', 'any')))
+        return features.reset_index(drop=True)
 
     def train_on_logs(self, parsed_data: Dict) -> float:
         """Train model on historical log data"""
-        features_df, labels = self.extract_features_from_logs(parsed_data)
-        if features_df.empty:
+        # The model only needs the matrix, so skip the feature DataFrame
+        labels, samples = _log_samples(parsed_data)
+        if not samples:
             raise ValueError("No valid features extracted from log data")
         
-        return self._train_model(features_df, labels)
+        return self._train_model(_sample_matrix(samples), labels)
     
     def train_on_events(self, events_df: pd.DataFrame, labels: List[str]) -> float:
         """Train model on real-time event data"""
@@ -93,48 +128,154 @@ class RansomwareTrainer:
         
         return self._train_model(features_df, labels)
     
-    def _train_model(self, features: pd.DataFrame, labels: List[str]) -> float:
+    def _train_model(self, features: Union[pd.DataFrame, np.ndarray], labels: List[str]) -> float:
         """Internal method to train the model"""
         encoded_labels = self.label_encoder.fit_transform(labels)
         
         X_train, X_test, y_train, y_test = train_test_split(
-            features, encoded_labels, test_size=0.2, random_state=42
+            self._as_model_input(features), encoded_labels, test_size=0.2, random_state=42
         )
         
+        # Trees are independent, so build them on every core
         self.model = RandomForestClassifier(
             n_estimators=100,
             max_depth=10,
-            random_state=42
+            random_state=42,
+            n_jobs=-1
         )
         
         self.model.fit(X_train, y_train)
         accuracy = self.model.score(X_test, y_test)
+        # Predictions run serially unless predict_batch asks joblib for
+        # threads; one sample or a few windows cost less than dispatching
+        self.model.set_params(n_jobs=None)
         
-        # Save the trained model
-        joblib.dump((self.model, self.label_encoder), self.model_path)
-        self.logger.info(f"Model trained with accuracy: {accuracy:.2f}")
+        self._save_model()
+        logger.info(f"Model trained with accuracy: {accuracy:.2f}")
         
         return accuracy
     
-    def predict(self, data: Union[Dict, pd.DataFrame]) -> str:
-        """Predict on either log data or event data"""
+    def update_on_logs(self, parsed_data: Dict, n_new_trees: int = 20) -> float:
+        """
+        Grow the saved model with trees fitted on new log data, keeping the
+        trees it already has instead of refitting the whole forest.
+        
+        Args:
+            parsed_data: New RansomwareLogProcessor output; it must cover
+                every family the model was trained on, and no others
+            n_new_trees: Number of trees to add to the forest
+            
+        Returns:
+            Accuracy of the grown forest on the held-out part of the new data
+        """
         if self.model is None:
-            self.model, self.label_encoder = joblib.load(self.model_path)
+            self._load_model()
+        
+        labels, samples = _log_samples(parsed_data)
+        if not samples:
+            raise ValueError("No valid features extracted from log data")
+        # The old trees vote over the trained classes; transform raises on
+        # an unseen family, which needs a full train_on_logs
+        encoded_labels = self.label_encoder.transform(labels)
         
-        # Handle different input types
+        X_train, X_test, y_train, y_test = train_test_split(
+            _sample_matrix(samples), encoded_labels, test_size=0.2, random_state=42
+        )
+        if len(np.unique(y_train)) < len(self.label_encoder.classes_):
+            raise ValueError("New log data must cover every trained family; use train_on_logs")
+        
+        # warm_start makes fit keep the fitted trees and build only the new ones
+        self.model.set_params(warm_start=True, n_estimators=self.model.n_estimators + n_new_trees,
+                              n_jobs=-1)
+        self.model.fit(X_train, y_train)
+        accuracy = self.model.score(X_test, y_test)
+        self.model.set_params(warm_start=False, n_jobs=None)
+        
+        self._save_model()
+        logger.info(f"Model updated to {self.model.n_estimators} trees "
+                    f"with accuracy: {accuracy:.2f}")
+        
+        return accuracy
+    
+    def _save_model(self):
+        """
+        Save the model uncompressed, so predict() can memory-map its arrays.
+        A new file is written and renamed over the old one: a model another
+        process has mapped would break if its file were truncated in place.
+        """
+        temp_path = self.model_path + '.tmp'
+        joblib.dump((self.model, self.label_encoder), temp_path)
+        os.replace(temp_path, self.model_path)
+    
+    @staticmethod
+    def _as_model_input(features: Union[pd.DataFrame, np.ndarray]) -> np.ndarray:
+        """
+        Feature matrix in the layout the forest works on: C-contiguous
+        float32. Converting once here saves sklearn a float64 copy and a
+        second conversion on every fit, score and predict; a matrix that
+        already has the layout is passed through without a copy.
+        """
+        return np.ascontiguousarray(features, dtype=np.float32)
+    
+    def _load_model(self):
+        """Load the saved model once, even when predictions start concurrently"""
+        with self._load_lock:
+            if self.model is not None:
+                return
+            # Map the tree arrays from the file instead of reading and
+            # allocating them, which shortens the first prediction
+            model, self.label_encoder = joblib.load(self.model_path, mmap_mode='r')
+            model.set_params(n_jobs=None)  # Also for models saved with n_jobs=-1
+            self.model = model
+    
+    def predict_batch(self, samples: List[Dict]) -> List[str]:
+        """
+        Predict many log samples with a single call into the model, so
+        input validation and tree dispatch are paid once per batch.
+        
+        Args:
+            samples: Log samples as produced by RansomwareLogProcessor
+            
+        Returns:
+            Predicted label for each sample, in order
+        """
+        if self.model is None:
+            self._load_model()
+        if not samples:
+            return []
+        if not all(samples):
+            raise ValueError("Could not extract features from input data")
+        
+        # Tree traversal releases the GIL, so on large batches threads split
+        # the trees between them and share the matrix without pickling it
+        parallel = (joblib.parallel_config(backend='threading', n_jobs=-1)
+                    if len(samples) >= PARALLEL_PREDICT_MIN_SAMPLES else contextlib.nullcontext())
+        with parallel:
+            codes = self.model.predict(_sample_matrix(samples))
+        # Encoded labels index the encoder's sorted classes
+        return self.label_encoder.classes_[codes].tolist()
+    
+    def predict(self, data: Union[Dict, pd.DataFrame]) -> str:
+        """Predict on either log data or event data"""
         if isinstance(data, dict):
-            features_df, _ = self.extract_features_from_logs({'predict': {'sample': [data]}})
-        else:
-            features_df = self.extract_features_from_events(data)
+            return self.predict_batch([data])[0]
+        
+        if self.model is None:
+            self._load_model()
         
+        features_df = self.extract_features_from_events(data)
         if features_df.empty:
             raise ValueError("Could not extract features from input data")
         
-        prediction = self.model.predict(features_df)
-        return self.label_encoder.inverse_transform(prediction)[0]
+        prediction = self.model.predict(self._as_model_input(features_df))
+        return self.label_encoder.classes_[prediction[0]]
 
 # Example usage
 if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
     trainer = RansomwareTrainer()
     
     # Example: Train on log data